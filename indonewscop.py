@@ -17,41 +17,105 @@ Notes:
   * This script won't bypass paywalls or authentication.
 """
 import argparse
+import asyncio
+import concurrent.futures
+import contextlib
 import csv
 import json
 import os
 import re
 import sys
+import tempfile
+import threading
 import time
 import hashlib
+from collections import defaultdict
 from datetime import datetime, timezone
-from urllib.parse import urlparse
-from urllib import robotparser
+from urllib.parse import urldefrag, urlparse
 
+import aiohttp
 import requests
-import dateparser
+from protego import Protego
 
 # Primary extractor
 import trafilatura
+from trafilatura.settings import DEFAULT_CONFIG
 
-# Fallback extractor (optional)
+# c-ares DNS for aiohttp instead of getaddrinfo in the thread pool (optional)
 try:
-    from newspaper import Article
-    NEWSPAPER_OK = True
+    import aiodns  # noqa: F401
+    AIODNS_OK = True
 except Exception:
-    NEWSPAPER_OK = False
+    AIODNS_OK = False
+
+# Fast JSON (optional)
+try:
+    import orjson
+    ORJSON_OK = True
+except Exception:
+    ORJSON_OK = False
+
+# Fallback extractor (optional), imported on first use: newspaper3k is slow to load.
+# None = not tried yet, False = unavailable, else (Article, shared Config).
+_NEWSPAPER = None
+
+
+def _load_newspaper():
+    global _NEWSPAPER
+    if _NEWSPAPER is None:
+        try:
+            from newspaper import Article, Config
+            # One shared config instead of a fresh one per Article
+            cfg = Config()
+            cfg.fetch_images = False
+            cfg.memoize_articles = False
+            cfg.follow_meta_refresh = False
+            cfg.MIN_WORD_COUNT = 50
+            _NEWSPAPER = (Article, cfg)
+        except Exception:
+            _NEWSPAPER = False
+    return _NEWSPAPER
 
 
 # Use a UA that reflects the repo name (replace <your-username> with your GitHub username if you like)
 DEFAULT_UA = "Mozilla/5.0 (compatible; IndoNewsCop/1.0; +https://github.com/<your-username>/indonewscop)"
+DEFAULT_HEADERS = {"User-Agent": DEFAULT_UA, "Accept-Language": "en,*;q=0.5"}
+# All blocking HTTP goes through this session so urllib3 can reuse pooled connections.
+# Keep it keep-alive: never add "Connection: close" to these headers.
 SESSION = requests.Session()
-SESSION.headers.update({"User-Agent": DEFAULT_UA, "Accept-Language": "en,*;q=0.5"})
+SESSION.headers.update(DEFAULT_HEADERS)
+
+# robots.txt parsers per "scheme://host": (parser or None if unreachable, expires_at)
+_ROBOTS_CACHE = {}
+_ROBOTS_TTL = 6 * 3600
+_ROBOTS_FAIL_TTL = 10 * 60  # retry unreachable or erroring (5xx) robots.txt sooner
+
+# aiohttp keeps resolved addresses per host for the run; the blocking requests path only
+# fetches robots.txt, once per host per _ROBOTS_TTL, so it needs no DNS cache of its own
+_DNS_CACHE_TTL = 300
+
+# Largest page we download, shared with trafilatura's own fetch limit
+_MAX_PAGE_BYTES = DEFAULT_CONFIG.getint("DEFAULT", "MAX_FILE_SIZE")
+
+# Consecutive trafilatura failures per host; past the limit we go straight to newspaper3k
+_TRAF_FAILS = {}
+_TRAF_MAX_FAILS = 3
+_TRAF_SKIPS = {}
+_TRAF_RETRY_EVERY = 10
+# trafilatura text at least this long is accepted without a title
+_TRAF_MIN_CHARS = 500
+
+# Serializes catalog appends coming from executor threads
+_CATALOG_LOCK = threading.Lock()
+
+
+_SLUG_STRIP = re.compile(r"[^a-z0-9\s\-_.]")
+_SLUG_SPACE = re.compile(r"\s+")
 
 
 def slugify(text, max_len=80):
-    text = text.strip().lower()
-    text = re.sub(r"[^a-z0-9\s\-_.]", "", text)
-    text = re.sub(r"\s+", "-", text)
+    text = _SLUG_STRIP.sub("", text.strip().lower())
+    text = _SLUG_SPACE.sub("-", text)
     if len(text) > max_len:
         text = text[:max_len].rstrip("-_")
     return text or "untitled"
@@ -62,36 +126,118 @@ def read_urls_from_file(path):
         return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
 
 
-def robots_allowed(url, user_agent=DEFAULT_UA, timeout=10):
+def dedupe_urls(urls):
+    # Fragments never change what the server returns, so "a#x" and "a#y" are one fetch
+    seen = set()
+    unique = []
+    for url in urls:
+        key = urldefrag(url).url
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+
+def read_catalog_urls(jsonl_path):
+    if not jsonl_path or not os.path.exists(jsonl_path):
+        return set()
+    loads = orjson.loads if ORJSON_OK else json.loads
+    urls = set()
+    with open(jsonl_path, "rb") as f:
+        for line in f:
+            try:
+                record = loads(line)
+            except Exception:
+                continue
+            # Failed fetches are cataloged as bare {"url": ...} records; those should be retried
+            if isinstance(record, dict) and record.get("url") and record.get("text"):
+                urls.add(urldefrag(record["url"]).url)
+    return urls
+
+
+def _robots_parser(url, timeout=10):
     parsed = urlparse(url)
-    robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-    rp = robotparser.RobotFileParser()
+    key = f"{parsed.scheme}://{parsed.netloc}"
+    cached = _ROBOTS_CACHE.get(key)
+    if cached and time.time() < cached[1]:
+        return cached[0]
+    ttl = _ROBOTS_TTL
     try:
-        rp.set_url(robots_url)
-        rp.read()
-        return rp.can_fetch(user_agent, url)
+        resp = SESSION.get(f"{key}/robots.txt", timeout=timeout)
+        # Like urllib's RobotFileParser: 401/403 and server errors disallow all, other 4xx allow all
+        if resp.status_code in (401, 403):
+            rp = Protego.parse("User-agent: *\nDisallow: /")
+        elif resp.status_code >= 500:
+            rp = Protego.parse("User-agent: *\nDisallow: /")
+            ttl = _ROBOTS_FAIL_TTL
+        elif resp.status_code >= 400:
+            rp = Protego.parse("")
+        else:
+            rp = Protego.parse(resp.text)
     except Exception:
+        rp = None
+        ttl = _ROBOTS_FAIL_TTL
+    _ROBOTS_CACHE[key] = (rp, time.time() + ttl)
+    return rp
+
+
+def robots_allowed(url, user_agent=DEFAULT_UA, timeout=10):
+    rp = _robots_parser(url, timeout=timeout)
+    if rp is None:
         # If robots.txt is not reachable, default to True but be gentle
         return True
+    return rp.can_fetch(url, user_agent)
 
 
-def fetch_with_trafilatura(url):
-    downloaded = trafilatura.fetch_url(url, no_ssl=True)  # be forgiving on some sites
-    if not downloaded:
+def robots_crawl_delay(url, user_agent=DEFAULT_UA):
+    # Only consults the cache filled by robots_allowed(), so it is cheap to call on the loop
+    parsed = urlparse(url)
+    cached = _ROBOTS_CACHE.get(f"{parsed.scheme}://{parsed.netloc}")
+    if not cached or cached[0] is None:
         return None
-    result_json = trafilatura.extract(
-        downloaded,
-        output_format="json",
-        include_comments=False,
-        with_metadata=True,
-        favor_precision=True,
-        include_links=False,
-        json_output=True,
-    )
-    if not result_json:
+    return cached[0].crawl_delay(user_agent)
+
+
+async def fetch_html(session, url, timeout=20):
+    try:
+        # ssl=False: be forgiving on some sites
+        async with session.get(url, ssl=False, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            if resp.status != 200:
+                return None
+            # Same size cap as trafilatura.fetch_url, checked while streaming so oversized or
+            # endless responses are never buffered whole
+            if resp.content_length and resp.content_length > _MAX_PAGE_BYTES:
+                return None
+            body = bytearray()
+            async for chunk in resp.content.iter_chunked(1 << 16):
+                body += chunk
+                if len(body) > _MAX_PAGE_BYTES:
+                    return None
+            # Raw bytes: aiohttp>=3.9 assumes UTF-8 without a header charset, while trafilatura
+            # and newspaper3k detect <meta charset> / undeclared encodings themselves
+            return bytes(body)
+    except Exception:
+        return None
+
+
+def fetch_with_trafilatura(url, html):
+    if not html:
         return None
     try:
-        data = json.loads(result_json)
+        # bare_extraction hands back the extracted fields directly, no JSON round trip.
+        # No with_metadata: Python output always carries metadata, and on trafilatura 1.x the
+        # flag turns into only_with_metadata, which drops pages lacking a date/title/URL.
+        data = trafilatura.bare_extraction(
+            html,
+            url=url,
+            include_comments=False,
+            favor_precision=True,
+            include_links=False,
+        )
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            data = data.as_dict()
         # Normalize keys to our schema
         return {
             "url": url,
@@ -105,18 +251,15 @@ def fetch_with_trafilatura(url):
         return None
 
 
-def fetch_with_newspaper(url):
-    if not NEWSPAPER_OK:
+def fetch_with_newspaper(url, html):
+    newspaper = _load_newspaper() if html else None
+    if not newspaper:
         return None
+    Article, config = newspaper
     try:
-        art = Article(url)
-        art.download()
+        art = Article(url, config=config)
+        art.set_html(html)
         art.parse()
-        # Try NLP for keywords/authors if needed
-        try:
-            art.nlp()
-        except Exception:
-            pass
         dt = None
         if art.publish_date:
             # Convert datetime to ISO string
@@ -133,14 +276,34 @@ def fetch_with_newspaper(url):
         return None
 
 
-def coalesce_article(url):
-    # Try trafilatura first
-    data = fetch_with_trafilatura(url)
-    if data and data.get("title") and data.get("text"):
-        return data
+def _try_trafilatura(host):
+    if _TRAF_FAILS.get(host, 0) < _TRAF_MAX_FAILS:
+        return True
+    # Probe a host where trafilatura is off every _TRAF_RETRY_EVERY URLs, in case it recovers
+    skipped = _TRAF_SKIPS.get(host, 0) + 1
+    if skipped >= _TRAF_RETRY_EVERY:
+        _TRAF_SKIPS[host] = 0
+        return True
+    _TRAF_SKIPS[host] = skipped
+    return False
+
+
+def coalesce_article(url, html):
+    # Try trafilatura first on the already-downloaded HTML, unless it keeps failing on this host.
+    # Failed downloads say nothing about the extractor, so they neither count nor consume a probe.
+    host = urlparse(url).netloc
+    data = None
+    if html and _try_trafilatura(host):
+        data = fetch_with_trafilatura(url, html)
+        # A long enough text is kept even without a title (save_markdown falls back to the site name)
+        text = data.get("text") if data else None
+        if text and (data.get("title") or len(text) >= _TRAF_MIN_CHARS):
+            _TRAF_FAILS[host] = 0
+            return data
+        _TRAF_FAILS[host] = _TRAF_FAILS.get(host, 0) + 1
 
     # Fallback to newspaper3k
-    fallback = fetch_with_newspaper(url)
+    fallback = fetch_with_newspaper(url, html)
     if fallback and fallback.get("title") and fallback.get("text"):
         # If trafilatura had some metadata we prefer (e.g., date), merge
         if data:
@@ -157,21 +320,28 @@ def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
 
 
+_FM_TEMPLATE = '---\ntitle: {title}\nurl: {url}\nsite: {site}\ndate: {date}\nauthors:\n{authors_block}---\n'
+
+
 def save_markdown(record, out_dir):
     ensure_dir(out_dir)
     # Build filename: YYYY-MM-DD_title-slug.md (fallback to hash if no title)
     date_part = ""
     if record.get("date"):
+        # Extractors usually emit ISO-8601; only fall back to dateparser for anything else
         try:
-            dt = dateparser.parse(record["date"])
-            if dt:
-                date_part = dt.strftime("%Y-%m-%d") + "_"
-        except Exception:
-            pass
+            dt = datetime.fromisoformat(record["date"].replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                import dateparser  # slow to import, only needed for non-ISO dates
+                dt = dateparser.parse(record["date"])
+            except Exception:
+                dt = None
+        if dt:
+            date_part = dt.strftime("%Y-%m-%d") + "_"
     title = record.get("title") or record.get("sitename") or urlparse(record["url"]).netloc
     slug = slugify(title)
     if slug == "untitled":
-        import hashlib
         slug = hashlib.sha1(record["url"].encode("utf-8")).hexdigest()[:10]
     fname = f"{date_part}{slug}.md"
     fpath = os.path.join(out_dir, fname)
@@ -180,44 +350,126 @@ def save_markdown(record, out_dir):
     authors = record.get("authors") or []
     if isinstance(authors, str):
         authors = [authors]
-    fm = [
-        "---",
-        f'title: "{title.replace(chr(34), "\'")}"',
-        f"url: {record.get('url','')}",
-        f"site: {record.get('sitename','')}",
-        f"date: {record.get('date') or ''}",
-        "authors:",
-    ] + [f"  - {a}" for a in authors] + ["---", ""]
+    fm = _FM_TEMPLATE.format(
+        # A JSON string is a valid YAML double-quoted scalar
+        title=json.dumps(title, ensure_ascii=False),
+        url=record.get("url", ""),
+        site=record.get("sitename", ""),
+        date=record.get("date") or "",
+        authors_block="".join(f"  - {a}\n" for a in authors),
+    )
 
     body = record.get("text") or ""
-    content = "\n".join(fm) + body.strip() + "\n"
-    with open(fpath, "w", encoding="utf-8") as f:
-        f.write(content)
+    data = bytearray(fm.encode("utf-8"))
+    data += body.strip().encode("utf-8")
+    data += b"\n"
+    # Writer threads can race on the same path (same day + same title): write a temp file
+    # and rename it into place so the result is always one whole record, last writer wins
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".md.tmp")
+    try:
+        os.fchmod(fd, 0o644)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp_path)
+        raise
+    os.close(fd)
+    os.replace(tmp_path, fpath)
     return fpath
 
 
-def append_jsonl(record, jsonl_path):
-    if not jsonl_path:
+CSV_FIELDS = ["url", "title", "date", "authors", "sitename", "text"]
+
+
+def open_catalogs(stack, jsonl_path, csv_path):
+    # Catalogs stay open for the whole run instead of being reopened per record
+    jsonl_fh = csv_writer = None
+    if jsonl_path:
+        ensure_dir(os.path.dirname(jsonl_path) or ".")
+        jsonl_fh = stack.enter_context(open(jsonl_path, "ab", buffering=1 << 16))
+    if csv_path:
+        ensure_dir(os.path.dirname(csv_path) or ".")
+        csv_fh = stack.enter_context(open(csv_path, "a", encoding="utf-8", newline="", buffering=1 << 16))
+        csv_writer = csv.DictWriter(csv_fh, fieldnames=CSV_FIELDS)
+        if os.path.getsize(csv_path) == 0:
+            csv_writer.writeheader()
+    return jsonl_fh, csv_writer
+
+
+def write_jsonl(record, fh):
+    if fh is None:
         return
-    ensure_dir(os.path.dirname(jsonl_path) or ".")
-    with open(jsonl_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    if ORJSON_OK:
+        fh.write(orjson.dumps(record) + b"\n")
+    else:
+        fh.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
 
 
-def append_csv(record, csv_path):
-    if not csv_path:
+def write_csv(record, writer):
+    if writer is None:
         return
-    ensure_dir(os.path.dirname(csv_path) or ".")
-    file_exists = os.path.exists(csv_path)
-    with open(csv_path, "a", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["url", "title", "date", "authors", "sitename", "text"])
-        if not file_exists:
-            writer.writeheader()
-        row = dict(record)
-        # ensure authors is a string in CSV
-        if isinstance(row.get("authors"), (list, tuple)):
-            row["authors"] = ", ".join(row["authors"])
-        writer.writerow(row)
+    row = dict(record)
+    # ensure authors is a string in CSV
+    if isinstance(row.get("authors"), (list, tuple)):
+        row["authors"] = ", ".join(row["authors"])
+    writer.writerow(row)
+
+
+def _persist(record, args, jsonl_fh, csv_writer):
+    md_path = save_markdown(record, args.output_dir)
+    with _CATALOG_LOCK:
+        write_jsonl(record, jsonl_fh)
+        write_csv(record, csv_writer)
+    return md_path
+
+
+async def crawl(urls, args, jsonl_fh, csv_writer):
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(max(args.concurrency, 1))
+    # Per-host token bucket: one request per host every `delay` seconds, hosts run in parallel
+    host_locks = defaultdict(asyncio.Lock)
+    last_hit = {}
+    total = len(urls)
+
+    async def worker(i, url, session):
+        host = urlparse(url).netloc
+        async with host_locks[host]:
+            delay = max(args.delay, 0.0)
+            if not args.skip_robots:
+                if not await loop.run_in_executor(None, robots_allowed, url):
+                    print(f"[SKIP] Robots.txt disallows fetching: {url}", file=sys.stderr)
+                    return
+                delay = max(delay, robots_crawl_delay(url) or 0.0)
+            if host in last_hit:
+                await asyncio.sleep(max(0.0, delay - (loop.time() - last_hit[host])))
+            # Take a fetch slot before releasing the host, so last_hit is when the request goes out
+            await sem.acquire()
+            last_hit[host] = loop.time()
+
+        try:
+            print(f"[{i}/{total}] Fetching: {url}")
+            html = await fetch_html(session, url)
+            # Both extractors parse this same HTML; extraction is blocking, keep it off the loop
+            record = await loop.run_in_executor(None, coalesce_article, url, html) or {"url": url}
+        finally:
+            sem.release()
+
+        # Basic normalization
+        if not record.get("authors"):
+            record["authors"] = []
+
+        # Save artifacts
+        md_path = await loop.run_in_executor(writer_pool, _persist, record, args, jsonl_fh, csv_writer)
+        print(f"    ✓ Saved {md_path}")
+
+    resolver = aiohttp.AsyncResolver() if AIODNS_OK else None
+    connector = aiohttp.TCPConnector(limit_per_host=2, ttl_dns_cache=_DNS_CACHE_TTL, resolver=resolver)
+    # Disk writes get their own small pool so they never queue behind extraction work
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as writer_pool:
+        async with aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS) as session:
+            await asyncio.gather(*(worker(i, url, session) for i, url in enumerate(urls, 1)))
 
 
 def main():
@@ -227,7 +479,9 @@ def main():
     ap.add_argument("--output-dir", default="./articles", help="Directory for Markdown files")
     ap.add_argument("--jsonl", default="./catalog.jsonl", help="Path to append JSONL catalog")
     ap.add_argument("--csv", default="./catalog.csv", help="Path to append CSV catalog")
-    ap.add_argument("--delay", type=float, default=2.0, help="Seconds to sleep between requests")
+    ap.add_argument("--delay", type=float, default=2.0, help="Seconds to sleep between requests to the same host")
+    ap.add_argument("--concurrency", type=int, default=4, help="Maximum number of articles fetched at once")
+    ap.add_argument("--skip-existing", action="store_true", help="Skip URLs already present in the JSONL catalog")
     ap.add_argument("--skip-robots", action="store_true", help="Skip robots.txt check (at your own risk)")
     args = ap.parse_args()
 
@@ -239,28 +493,19 @@ def main():
         print("No URLs provided. Pass URLs as arguments or with --from-file.", file=sys.stderr)
         sys.exit(2)
 
-    ensure_dir(args.output_dir)
-
-    for i, url in enumerate(urls, 1):
-        if not args.skip_robots and not robots_allowed(url):
-            print(f"[SKIP] Robots.txt disallows fetching: {url}", file=sys.stderr)
-            continue
-
-        print(f"[{i}/{len(urls)}] Fetching: {url}")
-        record = coalesce_article(url) or {"url": url}
+    urls = dedupe_urls(urls)
+    if args.skip_existing:
+        done = read_catalog_urls(args.jsonl)
+        urls = [u for u in urls if urldefrag(u).url not in done]
+        if not urls:
+            print("All URLs are already in the catalog.")
+            return
 
-        # Basic normalization
-        if not record.get("authors"):
-            record["authors"] = []
-
-        # Save artifacts
-        md_path = save_markdown(record, args.output_dir)
-        append_jsonl(record, args.jsonl)
-        append_csv(record, args.csv)
+    ensure_dir(args.output_dir)
 
-        print(f"    ✓ Saved {md_path}")
-        if i < len(urls):
-            time.sleep(max(args.delay, 0.0))
+    with contextlib.ExitStack() as stack:
+        jsonl_fh, csv_writer = open_catalogs(stack, args.jsonl, args.csv)
+        asyncio.run(crawl(urls, args, jsonl_fh, csv_writer))
 
     print("Done.")
 